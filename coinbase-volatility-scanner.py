@@ -6,7 +6,8 @@
 # The script checks for price movements every `FETCH_INTERVAL` seconds by default and updates the list of active pairs every `UPDATE_INTERVAL_MINUTES` minutes.
 
 # Setup:
-- Install the required dependencies: `pip install requests python-dotenv`.
+- Install the required dependencies: `pip install requests numpy numba orjson websockets python-dotenv`.
+- Optionally build the compiled window scan extension with `python setup.py build_ext --inplace` (requires `cython`).
 - Create a `.env` file in the same directory as this script with the following variables:
   - COINBASE_API_KEY=your_api_key
   - COINBASE_API_SECRET=your_api_secret
@@ -54,10 +55,28 @@
 """
 
 import os
+import re
+import sys
+import logging
 import time
+import queue
+import threading
+import numpy as np
+import orjson
+import asyncio
+import websockets
 import requests
+from numba import njit, prange
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
-from datetime import datetime, timedelta, timezone
+from datetime import datetime
+
+# Optional compiled window scan, built with `python setup.py build_ext --inplace`
+try:
+    import scanner_ext
+except ImportError:
+    scanner_ext = None
 
 # Load environment variables from .env file
 load_dotenv()
@@ -70,11 +89,38 @@ WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
 # General settings
 DEBUG = False  # Set to True for console-only output; set to False for Discord notifications
 USE_DISCORD_WEBHOOK = True  # Set to False to disable sending notifications to Discord
-FETCH_INTERVAL = 15  # Time in seconds between each price fetch
+DISCORD_BATCH_WINDOW_MS = 1000  # Time in milliseconds to collect queued messages into a single Discord post
+DISCORD_BATCH_THRESHOLD = 10  # Maximum number of queued messages combined into a single Discord post
+DISCORD_QUEUE_SIZE = 100  # Maximum number of messages waiting to be posted before new ones are dropped
+DISCORD_MAX_CONTENT_LENGTH = 2000  # Maximum number of characters Discord accepts in a single message
+FETCH_INTERVAL = 15  # Time in seconds between each price movement check
 RETRY_ATTEMPTS = 5  # Number of retry attempts for API calls if a connection fails
+WS_FEED_URL = "wss://ws-feed.exchange.coinbase.com"  # Coinbase Exchange websocket feed used for ticker updates
+WS_RECONNECT_DELAY = 5  # Time in seconds to wait before reconnecting a dropped websocket
+WS_MAX_RECONNECT_DELAY = 300  # Maximum time in seconds between reconnect attempts while the websocket keeps failing
+FEED_PING_INTERVAL = FETCH_INTERVAL  # Time in seconds between pings checking that a quiet websocket is still alive
+PRICE_STALE_AFTER = FETCH_INTERVAL * 4  # Time in seconds without websocket messages or pongs after which all prices are treated as unavailable
+CONNECTION_POOL_SIZE = 50  # Maximum number of pooled connections kept open per host
+REQUEST_TIMEOUT = 10  # Time in seconds to wait for an HTTP response before giving up
+USE_SCANNER_EXT = True  # Set to False to always use the numba kernel even when scanner_ext has been built
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))  # Directory where the script is located
 PAIRS_FILE = os.path.join(SCRIPT_DIR, "active_pairs_no_usd.txt")  # Ensure the file is created in the script's directory
 
+# Console logging, DEBUG level output such as the fetched price dump is only formatted when DEBUG is enabled
+log = logging.getLogger("scanner")
+log.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+
+# Function to create an HTTP session so requests to the same host reuse keep-alive connections
+# requests.Session is not thread-safe, so every thread making requests creates its own
+def create_session():
+    session = requests.Session()
+    session.headers["User-Agent"] = "volatility-scanner/1.0"
+    retry_strategy = Retry(total=RETRY_ATTEMPTS, backoff_factor=2, status_forcelist=[429, 500, 502, 503, 504])
+    session.mount("https://", HTTPAdapter(max_retries=retry_strategy, pool_connections=10, pool_maxsize=CONNECTION_POOL_SIZE))
+    return session
+
+SESSION = create_session()  # Session used by the main loop
+
 # Notification settings
 NOTIFICATION_THRESHOLD = 1  # Minimum percentage change required to trigger a notification
 WICK_MULTIPLIER = 3  # Multiplier for detecting "wicked out of range" events
@@ -84,6 +130,7 @@ NOTIFICATION_COOLDOWN_MULTIPLIER = 2  # Multiplier for applying to NOTIFICATION_
 # Historical data settings
 HISTORY_RETENTION_MINUTES = 60  # Time in minutes to retain price history for each pair
 HISTORICAL_INTERVAL_MINUTES = 60  # Time in minutes to calculate historical percentage change
+HISTORY_CAPACITY = HISTORY_RETENTION_MINUTES * 60 // FETCH_INTERVAL + 1  # Number of samples kept per pair
 
 # Update interval setting
 UPDATE_INTERVAL_MINUTES = 300  # Time in minutes to check and update the active pairs
@@ -96,17 +143,37 @@ POST_INITIALIZATION_MESSAGE = f"Initialization period of {HISTORICAL_INTERVAL_MI
 # Volatility text
 VOLATILE_TEXT = ""  # Text to use in volatile notifications, set to empty string for now
 
+# Derived settings, computed once from the configuration above
+WICK_FACTOR = WICK_MULTIPLIER * NOTIFICATION_THRESHOLD / 100.0  # Fraction of the initial price that counts as wicked out of range
+COOLDOWN_WINDOW_THRESH = NOTIFICATION_THRESHOLD * NOTIFICATION_COOLDOWN_MULTIPLIER  # Percentage change required during cooldown
+NOTIF_COOLDOWN_S = NOTIFICATION_COOLDOWN * 60.0  # Notification cooldown in seconds
+RECENT_WINDOW_S = 5 * 60.0  # Window in seconds used for the recent percentage change
+HISTORICAL_WINDOW_S = HISTORICAL_INTERVAL_MINUTES * 60.0  # Window in seconds used for the historical percentage change
+# The ring keeps samples by count, so the kernels also skip samples HISTORY_RETENTION_MINUTES old or older
+RETENTION_WINDOW_S = HISTORY_RETENTION_MINUTES * 60.0  # Retention in seconds, samples exactly this old are already expired
+HIST_PREFIX = f"[{HISTORICAL_INTERVAL_MINUTES}m "  # Prefix of the historical change shown in notifications
+
 # Data storage dictionaries
-PRICE_HISTORY = {}  # Dictionary to store price history for each pair
+PRICE_HISTORY = {}  # Dictionary mapping each pair to its row in the price history arrays
+HISTORY_TIMES = np.empty((0, HISTORY_CAPACITY), np.float64)  # Per-pair ring buffers of sample times in epoch seconds
+HISTORY_PRICES = np.empty((0, HISTORY_CAPACITY), np.float64)  # Per-pair ring buffers of sample prices
+HISTORY_COUNTS = np.empty(0, np.int64)  # Total samples written per pair, the ring write index is count % HISTORY_CAPACITY
 LAST_NOTIFIED = {}  # Dictionary to store the last percentage change notified for each pair
 LAST_NOTIFICATION_TIME = {}  # Dictionary to store the last notification time for each pair
 LAST_PRICES = {}  # Dictionary to store the most recent prices for each pair
+TICKER_PRICES = {}  # Dictionary of the latest prices pushed by the websocket ticker feed
+FEED_ALIVE_AT = None  # Time of the last message or pong on the websocket, None while it is disconnected
+PAIRS = ()  # Active pairs without the '-USD' suffix, only reloaded when active_pairs_no_usd.txt changes
+
+# Queue of messages waiting to be posted to Discord by the background worker
+DISCORD_QUEUE = queue.Queue(maxsize=DISCORD_QUEUE_SIZE)
 
 # Formatting settings
 PAIR_LENGTH = 11  # Total characters for pair names, including brackets
 PERCENT_LENGTH = 7  # Total characters for percentage changes
 PRICE_LENGTH = 10  # Total characters for price, including the dollar sign
 HISTORICAL_LENGTH = 13  # Total characters for historical data
+EMOJI_TABLE = ["▪️", "◼", "🟫", "🟪", "🟦", "🟩", "🟨", "🟧", "🟥", "💥"]  # Emojis for each whole percent of change
 
 # Function to load currency pairs from the file
 def load_pairs(file_path):
@@ -115,20 +182,18 @@ def load_pairs(file_path):
 
 # Function to fetch USD pairs and create/update active_pairs_no_usd.txt
 def update_active_pairs():
+    global PAIRS
     url = "https://api.pro.coinbase.com/products"
     try:
-        response = requests.get(url)
+        response = SESSION.get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching data from Coinbase Pro API: {e}")
+        log.error("Error fetching data from Coinbase Pro API: %s", e)
         return
     
-    products = response.json()
-    # Filter out only USD pairs
-    usd_pairs = [product for product in products if product['quote_currency'] == 'USD' and not product['trading_disabled']]
-    
-    # Remove '-USD' from each traded pair and sort them alphabetically
-    current_active_pairs_no_usd = sorted(pair['base_currency'] for pair in usd_pairs)
+    products = orjson.loads(response.content)
+    # Collect the base currency of every tradable USD pair, which is the pair name without '-USD'
+    current_active_pairs_no_usd = {product['base_currency'] for product in products if product['quote_currency'] == 'USD' and not product['trading_disabled']}
     
     # Load previous pairs from file
     previous_active_pairs_no_usd = set()
@@ -136,112 +201,270 @@ def update_active_pairs():
         with open(PAIRS_FILE, "r") as file:
             previous_active_pairs_no_usd = set(file.read().splitlines())
     except FileNotFoundError:
-        print(f"{PAIRS_FILE} not found, creating a new one.")
+        log.info("%s not found, creating a new one.", PAIRS_FILE)
     
-    # Check if the file needs to be updated
-    if set(current_active_pairs_no_usd) != previous_active_pairs_no_usd:
+    # Only sort and rewrite the file when the set of pairs has changed
+    if current_active_pairs_no_usd != previous_active_pairs_no_usd:
+        sorted_pairs = sorted(current_active_pairs_no_usd)
         with open(PAIRS_FILE, "w") as file:
-            for pair in current_active_pairs_no_usd:
-                file.write(pair + "\n")
-        print(f"{PAIRS_FILE} has been updated with traded pairs without the '-USD' suffix.")
+            file.write("".join(pair + "\n" for pair in sorted_pairs))
+        PAIRS = tuple(sorted_pairs)  # Keep the in-memory pairs in sync with the file
+        log.info("%s has been updated with traded pairs without the '-USD' suffix.", PAIRS_FILE)
     else:
-        print(f"No changes in active pairs. {PAIRS_FILE} remains the same.")
+        log.info("No changes in active pairs. %s remains the same.", PAIRS_FILE)
+
+# Function to fetch current prices for all pairs from a single Coinbase Exchange stats request
+def fetch_stats_prices(pairs, session):
+    try:
+        response = session.get("https://api.exchange.coinbase.com/products/stats", timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+        log.error("Error fetching prices from Coinbase Exchange API: %s", e)
+        data = {}
 
-# Function to fetch current spot prices from Coinbase API with retry logic
-def fetch_prices(pairs):
     prices = {}
     for pair in pairs:
-        for attempt in range(RETRY_ATTEMPTS):
-            try:
-                response = requests.get(f"https://api.coinbase.com/v2/prices/{pair}-USD/spot")
-                response.raise_for_status()
-                data = response.json()
-                prices[pair] = float(data['data']['amount'])
-                break  # Exit loop if successful
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.HTTPError) as e:
-                print(f"Error fetching price for {pair}: {e}")
-                if attempt < RETRY_ATTEMPTS - 1:
-                    print(f"Retrying... ({attempt + 1}/{RETRY_ATTEMPTS})")
-                    time.sleep(2)  # Wait before retrying
-                else:
-                    print(f"Failed to fetch price for {pair} after {RETRY_ATTEMPTS} attempts.")
-                    prices[pair] = None
-
-    if DEBUG:
+        stats = data.get(f"{pair}-USD")
+        if stats is None:
+            prices[pair] = None  # Pair missing from the stats response
+            continue
+        stats = stats.get("stats_24hour", stats)  # Last trade price lives in the 24h stats block
+        prices[pair] = float(stats["last"]) if stats.get("last") is not None else None
+    return prices
+
+# Background task that keeps TICKER_PRICES current from the Coinbase Exchange websocket ticker feed
+async def ws_loop():
+    global FEED_ALIVE_AT
+    stats_session = create_session()  # Only used from this feed's seed requests
+    delay = WS_RECONNECT_DELAY
+    subscribed_for = None  # The PAIRS tuple the rejected set below belongs to
+    rejected = set()  # Pairs Coinbase refused to subscribe, left out until PAIRS changes
+    while True:
+        pairs = PAIRS
+        if not pairs:
+            await asyncio.sleep(1)  # Wait for the first update_active_pairs run
+            continue
+        if pairs is not subscribed_for:
+            subscribed_for = pairs
+            rejected = set()
+        product_ids = [f"{pair}-USD" for pair in pairs if pair not in rejected]
+        dropped = False
+        keepalive = None
+        try:
+            async with websockets.connect(WS_FEED_URL) as ws:
+                await ws.send(orjson.dumps({"type": "subscribe", "product_ids": product_ids, "channels": ["ticker_batch"]}).decode())
+                # The feed only pushes on trades, so seed every pair once from the stats endpoint
+                seeded = await asyncio.to_thread(fetch_stats_prices, [pair for pair in pairs if pair not in rejected], stats_session)
+                TICKER_PRICES.update((pair, price) for pair, price in seeded.items() if price is not None)
+                FEED_ALIVE_AT = time.time()
+                keepalive = asyncio.create_task(_feed_keepalive(ws))
+                async for raw_message in ws:
+                    FEED_ALIVE_AT = time.time()
+                    message = orjson.loads(raw_message)
+                    if message.get("type") == "ticker":
+                        TICKER_PRICES[message["product_id"].removesuffix("-USD")] = float(message["price"])
+                        delay = WS_RECONNECT_DELAY  # The feed is healthy again
+                    elif message.get("type") == "error":
+                        reason = message.get("reason") or ""
+                        log.error("Coinbase websocket error: %s (%s)", message.get("message"), reason)
+                        # A single unknown product rejects the whole subscription, so leave out the ones named in the reason
+                        named = {product_id.removesuffix("-USD") for product_id in re.findall(r"[A-Za-z0-9]+-USD", reason)}
+                        named &= set(pairs) - rejected
+                        if named:
+                            log.warning("Dropping %s from the websocket subscription.", ", ".join(sorted(named)))
+                            rejected |= named
+                            for pair in named:
+                                TICKER_PRICES.pop(pair, None)
+                            dropped = True
+                            break
+                    if PAIRS is not pairs:
+                        break  # Reconnect to subscribe to the updated pairs
+        except Exception as e:
+            # Any failure, including a malformed message or stats response, must not end the feed thread
+            log.error("Coinbase websocket feed failed: %s: %s", type(e).__name__, e)
+        finally:
+            FEED_ALIVE_AT = None  # Every price is stale until the feed is connected again
+            if keepalive is not None:
+                keepalive.cancel()
+
+        if PAIRS is not pairs:
+            continue  # Resubscribe straight away when the active pairs changed
+        if dropped:
+            await asyncio.sleep(WS_RECONNECT_DELAY)  # Resubscribe the remaining pairs without growing the backoff
+            continue
+        # Back off on every other disconnect, doubling the delay while failures repeat
+        log.info("Reconnecting to the Coinbase websocket in %s seconds.", delay)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WS_MAX_RECONNECT_DELAY)
+
+# Background task that pings the websocket so a quiet but healthy feed still counts as alive
+async def _feed_keepalive(ws):
+    global FEED_ALIVE_AT
+    while True:
+        await asyncio.sleep(FEED_PING_INTERVAL)
+        try:
+            pong_waiter = await ws.ping()
+            await asyncio.wait_for(pong_waiter, timeout=FEED_PING_INTERVAL)
+        except Exception:
+            return  # Let FEED_ALIVE_AT age out, the connection itself handles the disconnect
+        FEED_ALIVE_AT = time.time()
+
+# Function to run the websocket ticker feed on its own event loop in a background thread
+def _ticker_worker():
+    asyncio.run(ws_loop())
+
+# Function to take a snapshot of the latest pushed prices, no network I/O happens here
+def fetch_prices(pairs):
+    # While the feed is down or silent the last prices are not current, so treat them as failed fetches
+    alive_at = FEED_ALIVE_AT
+    if alive_at is None or alive_at < time.time() - PRICE_STALE_AFTER:
+        prices = dict.fromkeys(pairs)
+    else:
+        prices = {pair: TICKER_PRICES.get(pair) for pair in pairs}
+
+    if log.isEnabledFor(logging.DEBUG):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] DEBUG: Fetched prices: {prices}")  # Print all prices in one large data pull with a timestamp
+        log.debug("[%s] DEBUG: Fetched prices: %s", timestamp, prices)  # Print all prices in one large data pull with a timestamp
 
     return prices
 
 # Function to update the price history and track highs and lows for each pair
-def update_price_history(prices):
-    current_time = datetime.now(timezone.utc)
-    retention_period = timedelta(minutes=HISTORY_RETENTION_MINUTES)
+def update_price_history(prices, current_time):
+    global HISTORY_TIMES, HISTORY_PRICES, HISTORY_COUNTS
     for pair, price in prices.items():
         if price is None:
             continue  # Skip pairs that failed to fetch
-        if pair not in PRICE_HISTORY:
-            PRICE_HISTORY[pair] = []
-        PRICE_HISTORY[pair].append((current_time, price))
-        # Remove data older than the configured HISTORY_RETENTION_MINUTES
-        PRICE_HISTORY[pair] = [
-            (timestamp, p) for timestamp, p in PRICE_HISTORY[pair]
-            if timestamp > current_time - retention_period
-        ]
+        row = PRICE_HISTORY.get(pair)
+        if row is None:
+            row = PRICE_HISTORY[pair] = len(PRICE_HISTORY)
+            if row >= len(HISTORY_COUNTS):
+                # Double the number of rows so new pairs only occasionally trigger a reallocation
+                rows = max(2 * len(HISTORY_COUNTS), 64)
+                HISTORY_TIMES = np.resize(HISTORY_TIMES, (rows, HISTORY_CAPACITY))
+                HISTORY_PRICES = np.resize(HISTORY_PRICES, (rows, HISTORY_CAPACITY))
+                HISTORY_COUNTS = np.concatenate((HISTORY_COUNTS, np.zeros(rows - len(HISTORY_COUNTS), np.int64)))
+        # The ring overwrites its oldest sample once HISTORY_RETENTION_MINUTES worth of fetches are stored
+        index = HISTORY_COUNTS[row] % HISTORY_CAPACITY
+        HISTORY_TIMES[row, index] = current_time
+        HISTORY_PRICES[row, index] = price
+        HISTORY_COUNTS[row] += 1
+
+# Compiled kernel evaluating one pair's ring buffer with a single reverse scan from the newest sample
+# Returns (found, current price, recent % change, historical % change, wicked) where found is False when no sample is recent
+# A zero initial price reports no change and never wicks, the same as scanner_ext.scan_all
+@njit(cache=True, fastmath=True)
+def _eval_pair(times, prices, n, now_s, recent_s, hist_s, retention_s, wick_factor):
+    capacity = prices.shape[0]
+    count = min(n, capacity)
+    recent_cutoff = now_s - recent_s
+    hist_cutoff = now_s - hist_s
+    retention_cutoff = now_s - retention_s  # Samples at or before this are expired, matching the old eviction
+    newest_time = times[(n - 1) % capacity] if count > 0 else 0.0
+    if count == 0 or newest_time < recent_cutoff or newest_time <= retention_cutoff:
+        return False, 0.0, 0.0, 0.0, False
+
+    current_price = prices[(n - 1) % capacity]
+    high_price = current_price
+    low_price = current_price
+    initial_price = current_price
+    historical_initial_price = current_price
+    # Timestamps are written in order, so the scan stops at the first sample older than both windows or expired
+    oldest_cutoff = min(recent_cutoff, hist_cutoff)
+    for k in range(count):
+        index = (n - 1 - k) % capacity
+        timestamp = times[index]
+        if timestamp < oldest_cutoff or timestamp <= retention_cutoff:
+            break
+        price = prices[index]
+        if timestamp >= recent_cutoff:
+            if price > high_price:
+                high_price = price
+            if price < low_price:
+                low_price = price
+            initial_price = price  # Ends on the oldest sample inside the recent window
+        if timestamp >= hist_cutoff:
+            historical_initial_price = price  # Ends on the oldest sample inside the historical window
+
+    percentage_change = ((current_price - initial_price) / initial_price) * 100 if initial_price != 0 else 0.0
+    historical_percentage_change = ((current_price - historical_initial_price) / historical_initial_price) * 100 if historical_initial_price != 0 else 0.0
+    wicked = initial_price != 0 and (high_price > initial_price * (1 + wick_factor) or low_price < initial_price * (1 - wick_factor))
+    return True, current_price, percentage_change, historical_percentage_change, wicked
+
+# Compiled kernel evaluating every pair in parallel, one matrix row per pair
+# out_flags is 0 when a pair is skipped or has no recent sample, 1 when it was evaluated and 2 when it also wicked out of range
+@njit(parallel=True, cache=True)
+def eval_all(times_mat, prices_mat, counts, skip, now_s, recent_s, hist_s, retention_s, wick_factor, out_current, out_pct, out_hist, out_flags):
+    for i in prange(prices_mat.shape[0]):
+        if skip[i]:
+            out_flags[i] = 0
+            continue
+        found, current_price, percentage_change, historical_percentage_change, wicked = _eval_pair(
+            times_mat[i], prices_mat[i], counts[i], now_s, recent_s, hist_s, retention_s, wick_factor)
+        out_current[i] = current_price
+        out_pct[i] = percentage_change
+        out_hist[i] = historical_percentage_change
+        out_flags[i] = (2 if wicked else 1) if found else 0
+
+# Use the compiled extension when it has been built and enabled, otherwise fall back to the numba kernel
+scan_all = scanner_ext.scan_all if scanner_ext is not None and USE_SCANNER_EXT else eval_all
 
 # Function to check for significant price movements and "wicked out of range" events
-def check_price_movements():
+def check_price_movements(prices, current_time):
     notifications = []
-    current_time = datetime.now(timezone.utc)
-    historical_interval = timedelta(minutes=HISTORICAL_INTERVAL_MINUTES)
-    
-    for pair, history in PRICE_HISTORY.items():
-        if len(history) > 0:
-            initial_time = current_time - timedelta(minutes=5)
-            recent_prices = [price for timestamp, price in history if timestamp >= initial_time]
-            if len(recent_prices) > 0:
-                initial_price = recent_prices[0]
-                current_price = recent_prices[-1]
-                high_price = max(recent_prices)
-                low_price = min(recent_prices)
-                percentage_change = ((current_price - initial_price) / initial_price) * 100
-
-                # Calculate the historical percentage change over the configured interval
-                historical_prices = [price for timestamp, price in history if timestamp >= current_time - historical_interval]
-                if historical_prices:
-                    historical_initial_price = historical_prices[0]
-                    historical_percentage_change = ((current_price - historical_initial_price) / historical_initial_price) * 100
-                else:
-                    historical_percentage_change = 0
-
-                # Check if the pair has been notified recently and apply cooldown logic
-                last_notification_time = LAST_NOTIFICATION_TIME.get(pair, None)
-                if last_notification_time:
-                    time_since_last_notification = (current_time - last_notification_time).total_seconds() / 60  # convert to minutes
-                    if time_since_last_notification < NOTIFICATION_COOLDOWN and abs(percentage_change - LAST_NOTIFIED.get(pair, 0)) < NOTIFICATION_THRESHOLD * NOTIFICATION_COOLDOWN_MULTIPLIER:
-                        continue  # Skip if within cooldown and the percentage change is not significant
-
-                # Check if the price has significantly moved since last notification
-                last_price = LAST_PRICES.get(pair, None)
-                if last_price:
-                    movement_from_last = ((current_price - last_price) / last_price) * 100
-                    if abs(movement_from_last) < NOTIFICATION_THRESHOLD:
-                        continue  # Skip if movement from the last notification is not significant
-
-                # Update the last prices dictionary with the current price
-                LAST_PRICES[pair] = current_price
-
-                # Detect significant highs or lows (wicked out of range events)
-                wicked = False
-                if high_price > initial_price * (1 + WICK_MULTIPLIER * NOTIFICATION_THRESHOLD / 100):
-                    wicked = True
-                    notifications.append(format_notification(pair, percentage_change, current_price, historical_percentage_change, VOLATILE_TEXT))
-                elif low_price < initial_price * (1 - WICK_MULTIPLIER * NOTIFICATION_THRESHOLD / 100):
-                    wicked = True
-                    notifications.append(format_notification(pair, percentage_change, current_price, historical_percentage_change, VOLATILE_TEXT))
-
-                if abs(percentage_change) >= NOTIFICATION_THRESHOLD and not wicked:
-                    notifications.append(format_notification(pair, percentage_change, current_price, historical_percentage_change))
+    # Bind globals used inside the per-pair loops to locals so CPython looks them up with LOAD_FAST
+    _ln_get = LAST_NOTIFIED.get
+    _lnt_get = LAST_NOTIFICATION_TIME.get
+    _lp_get = LAST_PRICES.get
+    _prices_get = prices.get
+    _thresh = NOTIFICATION_THRESHOLD
+    _cool = NOTIF_COOLDOWN_S
+    _cool_thresh = COOLDOWN_WINDOW_THRESH
+    _volatile_text = VOLATILE_TEXT
+    _fmt = format_notification
+    _append = notifications.append
+
+    pair_count = len(PRICE_HISTORY)
+    # A pair whose price has not moved since LAST_PRICES was recorded can never pass the movement check, so skip it
+    skip = np.zeros(pair_count, np.uint8)
+    for pair, row in PRICE_HISTORY.items():
+        last_price = _lp_get(pair)
+        if last_price is not None and _prices_get(pair) == last_price:
+            skip[row] = 1
+    out_current = np.empty(pair_count, np.float64)
+    out_pct = np.empty(pair_count, np.float64)
+    out_hist = np.empty(pair_count, np.float64)
+    out_flags = np.empty(pair_count, np.int8)
+    scan_all(HISTORY_TIMES[:pair_count], HISTORY_PRICES[:pair_count], HISTORY_COUNTS[:pair_count], skip, current_time, RECENT_WINDOW_S, HISTORICAL_WINDOW_S, RETENTION_WINDOW_S, WICK_FACTOR,
+             out_current, out_pct, out_hist, out_flags)
+
+    # Rows are assigned in insertion order, so PRICE_HISTORY iterates in step with the output arrays
+    for pair, flag, current_price, percentage_change, historical_percentage_change in zip(
+            PRICE_HISTORY, out_flags.tolist(), out_current.tolist(), out_pct.tolist(), out_hist.tolist()):
+        if flag:
+            wicked = flag == 2
+
+            # Check if the pair has been notified recently and apply cooldown logic
+            last_notification_time = _lnt_get(pair, None)
+            if last_notification_time:
+                time_since_last_notification = current_time - last_notification_time
+                if time_since_last_notification < _cool and abs(percentage_change - _ln_get(pair, 0)) < _cool_thresh:
+                    continue  # Skip if within cooldown and the percentage change is not significant
+
+            # Check if the price has significantly moved since last notification
+            last_price = _lp_get(pair, None)
+            if last_price:
+                movement_from_last = ((current_price - last_price) / last_price) * 100
+                if abs(movement_from_last) < _thresh:
+                    continue  # Skip if movement from the last notification is not significant
+
+            # Update the last prices dictionary with the current price
+            LAST_PRICES[pair] = current_price
+
+            # Notify once on either a wicked out of range event or a move past the threshold
+            if wicked or abs(percentage_change) >= _thresh:
+                _append(_fmt(pair, percentage_change, current_price, historical_percentage_change, _volatile_text if wicked else ""))
+                if not wicked:
                     LAST_NOTIFIED[pair] = percentage_change  # Update last notified percentage change
                     LAST_NOTIFICATION_TIME[pair] = current_time  # Update last notification time
     return notifications
@@ -252,7 +475,7 @@ def format_notification(pair, change, current_price, historical_change, extra_in
     sign = "🔹" if change > 0 else "🔸"
     historical_emoji = get_emoji(historical_change)
     historical_sign = "🔹" if historical_change > 0 else "🔸"
-    historical_info = f"[{HISTORICAL_INTERVAL_MINUTES}m {'+' if historical_change > 0 else ''}{historical_change:.2f}%]"
+    historical_info = f"{HIST_PREFIX}{'+' if historical_change > 0 else ''}{historical_change:.2f}%]"
 
     # Pad the pair name to the desired length
     pair_display = f"[{pair}]".center(PAIR_LENGTH)
@@ -281,53 +504,108 @@ def format_notification(pair, change, current_price, historical_change, extra_in
 
 # Function to determine which emoji to use based on the percentage change
 def get_emoji(change):
-    if abs(change) < 1:
-        return "▪️"
-    elif abs(change) < 2:
-        return "◼"
-    elif abs(change) < 3:
-        return "🟫"
-    elif abs(change) < 4:
-        return "🟪"
-    elif abs(change) < 5:
-        return "🟦"
-    elif abs(change) < 6:
-        return "🟩"
-    elif abs(change) < 7:
-        return "🟨"
-    elif abs(change) < 8:
-        return "🟧"
-    elif abs(change) < 9:
-        return "🟥"
-    else:
-        return "💥"
+    # Each whole percent of movement maps to the next bucket, with 9% and above sharing the last one
+    return EMOJI_TABLE[min(int(abs(change)), 9)]
 
 # Function to send notifications either to the console or Discord
-def send_notifications(notifications):
+def send_notifications(notifications, timestamp):
     if notifications:
         for notification in notifications:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             message_console, message_discord = notification
-            print(f"[{timestamp}] {message_console}")  # Console output with timestamp
+            log.info("[%s] %s", timestamp, message_console)  # Console output with timestamp
         if USE_DISCORD_WEBHOOK and not DEBUG:
             batched_message = "\n".join([msg[1] for msg in notifications])
             send_to_discord(batched_message)  # Discord notification without timestamp
 
-# Function to send the message to a Discord channel via webhook
+# Function to queue a message for the background Discord worker without blocking the fetch loop
 def send_to_discord(message):
-    data = {"content": message}
-    requests.post(WEBHOOK_URL, json=data)
+    try:
+        DISCORD_QUEUE.put_nowait(message)
+    except queue.Full:
+        log.warning("Discord queue is full, dropping message.")
+
+# Function to pack messages into chunks that fit within Discord's content length limit
+def _discord_chunks(messages):
+    chunks = []
+    current = ""
+    for line in "\n".join(messages).split("\n"):
+        # A single line over the limit is split on its own so nothing is dropped
+        while len(line) > DISCORD_MAX_CONTENT_LENGTH:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:DISCORD_MAX_CONTENT_LENGTH])
+            line = line[DISCORD_MAX_CONTENT_LENGTH:]
+        if current and len(current) + 1 + len(line) > DISCORD_MAX_CONTENT_LENGTH:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+# Function to post one chunk to the Discord webhook, waiting out rate limits
+def _post_to_discord(session, content):
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            response = session.post(WEBHOOK_URL, json={"content": content}, timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            log.error("Error sending message to Discord: %s", e)
+            return
+        if response.status_code == 429:
+            # Discord reports how long to wait in the body, fall back to the Retry-After header
+            try:
+                retry_after = float(orjson.loads(response.content).get("retry_after"))
+            except (orjson.JSONDecodeError, AttributeError, TypeError, ValueError):
+                retry_after = float(response.headers.get("Retry-After", 1))
+            log.warning("Discord rate limit hit, retrying in %s seconds. (%s/%s)", retry_after, attempt + 1, RETRY_ATTEMPTS)
+            time.sleep(retry_after)
+            continue
+        if not response.ok:
+            log.error("Error sending message to Discord: HTTP %s %s", response.status_code, response.text)
+        return
+    log.error("Failed to send message to Discord after %s attempts due to rate limiting.", RETRY_ATTEMPTS)
+
+# Background worker that coalesces queued messages arriving within DISCORD_BATCH_WINDOW_MS into webhook POSTs
+def _discord_worker():
+    session = create_session()  # Only used from this worker thread
+    while True:
+        batch = [DISCORD_QUEUE.get()]
+        deadline = time.time() + DISCORD_BATCH_WINDOW_MS / 1000
+        while len(batch) < DISCORD_BATCH_THRESHOLD:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(DISCORD_QUEUE.get(timeout=remaining))
+            except queue.Empty:
+                break
+        for chunk in _discord_chunks(batch):
+            _post_to_discord(session, chunk)
 
 # Main loop of the script
 def main():
-    global SHOW_INITIAL_ALERT
+    global SHOW_INITIAL_ALERT, PAIRS
+    logging.basicConfig(stream=sys.stdout, format="%(message)s")  # Same stdout output as the previous print calls
     last_update_time = time.time() - UPDATE_INTERVAL_MINUTES * 60  # Convert minutes to seconds for time calculations
     initialization_time = time.time() + HISTORICAL_INTERVAL_MINUTES * 60  # End time for the initialization period
     initialization_posted = False  # To track if the post-initialization message has been posted
 
+    # Load the pairs file once, update_active_pairs refreshes PAIRS whenever the file changes
+    if os.path.exists(PAIRS_FILE):
+        PAIRS = tuple(load_pairs(PAIRS_FILE))
+
+    # Start the websocket feed that keeps TICKER_PRICES current
+    threading.Thread(target=_ticker_worker, daemon=True).start()
+
+    # Start the background worker that posts queued messages to Discord
+    if USE_DISCORD_WEBHOOK:
+        threading.Thread(target=_discord_worker, daemon=True).start()
+
     # Show the initial alert message only once when the script starts
     if SHOW_INITIAL_ALERT:
-        print(INITIAL_ALERT_MESSAGE)
+        log.info(INITIAL_ALERT_MESSAGE)
         if USE_DISCORD_WEBHOOK:
             send_to_discord(INITIAL_ALERT_MESSAGE)
         SHOW_INITIAL_ALERT = False
@@ -338,15 +616,16 @@ def main():
             update_active_pairs()  # Update active pairs every configured interval
             last_update_time = current_time
 
-        pairs = load_pairs(PAIRS_FILE)
-        prices = fetch_prices(pairs)
-        update_price_history(prices)
-        notifications = check_price_movements()
-        send_notifications(notifications)
+        prices = fetch_prices(PAIRS)
+        fetch_time = time.time()  # Shared by the history, the movement checks and the console timestamp for this tick
+        update_price_history(prices, fetch_time)
+        notifications = check_price_movements(prices, fetch_time)
+        if notifications:
+            send_notifications(notifications, datetime.fromtimestamp(fetch_time).strftime("%Y-%m-%d %H:%M:%S"))
 
         # Post the initialization complete message once the period has passed
         if not initialization_posted and current_time >= initialization_time:
-            print(POST_INITIALIZATION_MESSAGE)
+            log.info(POST_INITIALIZATION_MESSAGE)
             if USE_DISCORD_WEBHOOK:
                 send_to_discord(POST_INITIALIZATION_MESSAGE)
             initialization_posted = True
@@ -0,0 +1,78 @@
+# cython: language_level=3
+"""
+Optional compiled window scan for coinbase-volatility-scanner.py.
+
+Build in place with `python setup.py build_ext --inplace`. The script falls back to its numba kernel when this
+extension is not built. scan_all takes the same arguments and fills the same outputs as eval_all in the script,
+and likewise spreads the pairs across threads (OpenMP). A zero initial price reports no change and never wicks.
+"""
+
+cimport cython
+from cython.parallel cimport prange
+from libc.stdint cimport int64_t, int8_t, uint8_t
+
+
+# Evaluate one pair's ring buffer (raw row pointers) with a single reverse scan from the newest sample, writing row i of the outputs
+@cython.cdivision(True)
+cdef inline void _scan_pair(const double* times, const double* prices, int64_t capacity, int64_t n,
+                            double recent_cutoff, double hist_cutoff, double retention_cutoff, double wick_factor,
+                            double* out_current, double* out_pct, double* out_hist, int8_t* out_flags) noexcept nogil:
+    cdef int64_t count = n if n < capacity else capacity
+    cdef double oldest_cutoff = recent_cutoff if recent_cutoff < hist_cutoff else hist_cutoff
+    cdef int64_t k, index
+    cdef double timestamp, price, current_price, high_price, low_price, initial_price, historical_initial_price
+
+    if count == 0:
+        out_flags[0] = 0
+        return
+    index = (n - 1) % capacity
+    if times[index] < recent_cutoff or times[index] <= retention_cutoff:
+        out_flags[0] = 0
+        return
+
+    current_price = prices[index]
+    high_price = current_price
+    low_price = current_price
+    initial_price = current_price
+    historical_initial_price = current_price
+    # Timestamps are written in order, so the scan stops at the first sample older than both windows or expired
+    for k in range(count):
+        timestamp = times[index]
+        if timestamp < oldest_cutoff or timestamp <= retention_cutoff:
+            break
+        price = prices[index]
+        if timestamp >= recent_cutoff:
+            if price > high_price:
+                high_price = price
+            if price < low_price:
+                low_price = price
+            initial_price = price  # Ends on the oldest sample inside the recent window
+        if timestamp >= hist_cutoff:
+            historical_initial_price = price  # Ends on the oldest sample inside the historical window
+        index = index - 1 if index > 0 else capacity - 1  # Step back around the ring without a modulo per sample
+
+    out_current[0] = current_price
+    out_pct[0] = ((current_price - initial_price) / initial_price) * 100 if initial_price != 0 else 0.0
+    out_hist[0] = ((current_price - historical_initial_price) / historical_initial_price) * 100 if historical_initial_price != 0 else 0.0
+    if initial_price != 0 and (high_price > initial_price * (1 + wick_factor) or low_price < initial_price * (1 - wick_factor)):
+        out_flags[0] = 2
+    else:
+        out_flags[0] = 1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef void scan_all(const double[:, ::1] times_mat, const double[:, ::1] prices_mat, const int64_t[::1] counts,
+                    const uint8_t[::1] skip, double now_s, double recent_s, double hist_s, double retention_s, double wick_factor,
+                    double[::1] out_current, double[::1] out_pct, double[::1] out_hist, int8_t[::1] out_flags) noexcept nogil:
+    cdef Py_ssize_t i
+    cdef Py_ssize_t pairs = prices_mat.shape[0]
+    cdef int64_t capacity = prices_mat.shape[1]
+    if pairs == 0:
+        return
+    for i in prange(pairs, schedule="static"):
+        if skip[i]:
+            out_flags[i] = 0
+        else:
+            _scan_pair(&times_mat[i, 0], &prices_mat[i, 0], capacity, counts[i], now_s - recent_s, now_s - hist_s, now_s - retention_s, wick_factor,
+                       &out_current[i], &out_pct[i], &out_hist[i], &out_flags[i])
@@ -0,0 +1,18 @@
+# Builds the optional scanner_ext extension used by coinbase-volatility-scanner.py
+# Usage: python setup.py build_ext --inplace
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+extensions = [
+    Extension(
+        "scanner_ext",
+        ["scanner_ext.pyx"],
+        extra_compile_args=["-O3", "-march=native", "-ffast-math", "-fopenmp"],
+        extra_link_args=["-fopenmp"],  # scan_all spreads pairs across threads with cython.parallel.prange
+    )
+]
+
+setup(
+    name="scanner_ext",
+    ext_modules=cythonize(extensions),
+)